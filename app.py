@@ -3,9 +3,14 @@ Heat Acclimation Calendar - Flask app
 Based on TrainRight Ultrarunners' Heat Acclimation Cheat Sheet:
 https://trainright.com/ultrarunners-heat-acclimation-cheat-sheet/
 """
-from datetime import datetime, timedelta
+from datetime import date
+from functools import lru_cache
+from itertools import chain
 from calendar import monthcalendar, month_name
+from collections.abc import Mapping
+from types import MappingProxyType
 from flask import Flask, render_template, request
+from jinja2 import Template
 
 app = Flask(__name__)
 
@@ -13,31 +18,58 @@ app = Flask(__name__)
 # Per cheat sheet image: 10 days (race-19 to race-10), 2 off, sauna (race-7), 1 off, sauna (race-5), 4 off, race
 PROTOCOL1_BOUT_START_DAYS_OUT = 19  # first session is 19 days before race
 PROTOCOL1_BOUT_DAYS = 10
-PROTOCOL1_MAINTENANCE_DAYS = [7, 5]  # maintenance sessions 7 and 5 days before race
+PROTOCOL1_MAINTENANCE_DAYS = (7, 5)  # maintenance sessions 7 and 5 days before race
 
 # Protocol 2 (Repeated exposure): Pattern from cheat sheet, anchored to race date
 # Bout 1: 11 sessions over 14 days at 6+5 weeks out (days 2,3,5,6,7 then 9,10,12,13,14,15 of the 2-week block)
 # Maintenance: 2-4 weeks out, 2 sessions per week (days 2 and 5 of each 7-day block)
 # Bout 2: 3 sessions at 5, 4, and 2 days before race
+PROTOCOL2_BOUT1_OFFSETS = (0, 1, 3, 4, 5, 7, 8, 10, 11, 12, 13)  # days from start of the 14-day block
+PROTOCOL2_MAINTENANCE_WEEKS_OUT = (4, 3, 2)
+PROTOCOL2_MAINTENANCE_DAYS = (2, 5)  # days from start of each maintenance week
+PROTOCOL2_BOUT2_WEEK1_DAYS_OUT = (12, 11, 9, 8, 7, 6)  # matches Bout 1 pattern (skip Wed equiv)
+PROTOCOL2_BOUT2_WEEK2_DAYS_OUT = (5, 4, 2)
 
 
-def protocol1_sessions(race_date: datetime) -> tuple[list[datetime], list[datetime]]:
+def _record_sessions(type_map: dict[int, str], ordinals, cell_type: str) -> tuple[date, ...]:
+    """
+    Mark each date ordinal with cell_type in type_map, unless an earlier (higher-precedence) type
+    already claimed it. Returns the sessions as dates.
+    """
+    sessions = []
+    for o in ordinals:
+        type_map.setdefault(o, cell_type)
+        sessions.append(date.fromordinal(o))
+    return tuple(sessions)
+
+
+@lru_cache(maxsize=512)
+def protocol1_sessions(
+    race_date: date,
+) -> tuple[tuple[date, ...], tuple[date, ...], Mapping[int, str]]:
     """
     Single exposure: 10 consecutive days starting 19 days out, then maintenance at 7 and 5 days out.
     Per TrainRight cheat sheet: bout (race-19 to race-10), 2 off, sauna (race-7), 1 off, sauna (race-5), 4 off, race.
-    Returns (bout, maintenance).
+    Returns (bout, maintenance, type_map): session tuples for display, and a read-only mapping of
+    date ordinals to 'race' | 'bout' | 'maintenance' for the calendar. Results are cached per race date.
     """
+    race_ord = race_date.toordinal()
+    # Types are recorded in precedence order: race, bout, maintenance
+    type_map = {race_ord: "race"}
     # Bout: 10 consecutive days starting 19 days before race
-    first_day = race_date - timedelta(days=PROTOCOL1_BOUT_START_DAYS_OUT)
-    bout = [first_day + timedelta(days=i) for i in range(PROTOCOL1_BOUT_DAYS)]
+    first_ord = race_ord - PROTOCOL1_BOUT_START_DAYS_OUT
+    bout = _record_sessions(type_map, range(first_ord, first_ord + PROTOCOL1_BOUT_DAYS), "bout")
     # Maintenance: sessions at 7 and 5 days before race
-    maintenance = [
-        race_date - timedelta(days=d) for d in PROTOCOL1_MAINTENANCE_DAYS
-    ]
-    return (bout, maintenance)
+    maintenance = _record_sessions(
+        type_map, [race_ord - d for d in PROTOCOL1_MAINTENANCE_DAYS], "maintenance"
+    )
+    return (bout, maintenance, MappingProxyType(type_map))
 
 
-def protocol2_sessions(race_date: datetime) -> tuple[list[datetime], list[datetime], list[datetime]]:
+@lru_cache(maxsize=512)
+def protocol2_sessions(
+    race_date: date,
+) -> tuple[tuple[date, ...], tuple[date, ...], tuple[date, ...], Mapping[int, str]]:
     """
     Repeated exposure per TrainRight cheat sheet image.
     Pattern anchored to race date: schedule shifts so it aligns with race weekday.
@@ -45,125 +77,93 @@ def protocol2_sessions(race_date: datetime) -> tuple[list[datetime], list[dateti
     Bout 1: 11 sessions over 14 days at 6+5 weeks out.
     Maintenance: 2 sessions per week for 2-4 weeks out.
     Bout 2: sessions at 5, 4, 2 days before race.
-    Returns (bout1, maintenance, bout2).
+    Returns (bout1, maintenance, bout2, type_map): session tuples for display, and a read-only mapping
+    of date ordinals to 'race' | 'bout1' | 'maintenance' | 'bout2' for the calendar.
+    Results are cached per race date.
     """
-    race_norm = race_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Day arithmetic is done on date ordinals; weeks_out * 7 days before the race always
+    # falls on the race's weekday, so its Monday is race_weekday days earlier.
+    race_ord = race_date.toordinal()
+    race_weekday = race_date.weekday()
     # Image uses Saturday race; offset so block start shifts with race weekday
-    offset = (race_norm.weekday() - 5)  # 5=Saturday; Thu race -> -2 (start 2 days earlier)
+    offset = (race_weekday - 5)  # 5=Saturday; Thu race -> -2 (start 2 days earlier)
+    # Types are recorded in precedence order: race, bout1, maintenance, bout2
+    type_map = {race_ord: "race"}
 
     # Bout 1: 14-day block. Monday of "6 weeks before" in image; add offset for race weekday
-    monday_6w = (race_norm - timedelta(days=42)) - timedelta(
-        days=(race_norm - timedelta(days=42)).weekday()
+    monday_6w = race_ord - 42 - race_weekday
+    block_start = monday_6w + offset
+    bout1 = _record_sessions(
+        type_map, [block_start + i for i in PROTOCOL2_BOUT1_OFFSETS], "bout1"
     )
-    block_start = monday_6w + timedelta(days=offset)
-    bout1_offsets = [0, 1, 3, 4, 5, 7, 8, 10, 11, 12, 13]
-    bout1 = [block_start + timedelta(days=i) for i in bout1_offsets]
 
     # Maintenance: 3 blocks of 7 days (4, 3, 2 weeks out). 2 sessions at days 2 and 5 of each.
-    maintenance = []
-    for weeks_out in [4, 3, 2]:
-        week_center = race_norm - timedelta(days=weeks_out * 7)
-        monday_of_week = week_center - timedelta(days=week_center.weekday())
-        block_start_m = monday_of_week + timedelta(days=offset)
-        maintenance.append(block_start_m + timedelta(days=2))
-        maintenance.append(block_start_m + timedelta(days=5))
+    maintenance = _record_sessions(
+        type_map,
+        [
+            race_ord - weeks_out * 7 - race_weekday + offset + d
+            for weeks_out in PROTOCOL2_MAINTENANCE_WEEKS_OUT
+            for d in PROTOCOL2_MAINTENANCE_DAYS
+        ],
+        "maintenance",
+    )
 
     # Bout 2: 2 weeks. Week 1 = same on/off pattern as Bout 1 week 2 (days 12,11,9,8,7,6 before race).
     # Week 2 = tapered: 5, 4, 2 days before race.
-    bout2_week1_offsets = [12, 11, 9, 8, 7, 6]  # matches Bout 1 pattern (skip Wed equiv)
-    bout2_week1 = [race_norm - timedelta(days=d) for d in bout2_week1_offsets]
-    bout2_week2 = [race_norm - timedelta(days=d) for d in [5, 4, 2]]
-    bout2 = bout2_week1 + bout2_week2
+    bout2 = _record_sessions(
+        type_map,
+        [race_ord - d for d in PROTOCOL2_BOUT2_WEEK1_DAYS_OUT + PROTOCOL2_BOUT2_WEEK2_DAYS_OUT],
+        "bout2",
+    )
 
-    return (bout1, maintenance, bout2)
+    return (bout1, maintenance, bout2, MappingProxyType(type_map))
 
 
-def sessions_to_set(sessions: list[datetime]) -> set[datetime]:
-    """Normalize to date-only for membership tests."""
-    return {d.replace(hour=0, minute=0, second=0, microsecond=0) for d in sessions}
+@lru_cache(maxsize=4096)
+def _monthcalendar(year: int, month: int) -> tuple[tuple[int, ...], ...]:
+    """Cached, immutable calendar.monthcalendar: weeks of day numbers, 0 for days outside the month."""
+    return tuple(tuple(week) for week in monthcalendar(year, month))
 
 
-def month_calendar_data_protocol1(
-    year: int,
-    month: int,
-    bout_set: set[datetime],
-    maint_set: set[datetime],
-    race_date: datetime | None,
-):
+def month_calendar_data(year: int, month: int, type_map: Mapping[int, str]):
     """
-    Build calendar grid for Protocol 1. Each day is (day_num, type): 'race' | 'bout' | 'maintenance' | None.
+    Build calendar grid as a flat tuple of cells, Monday-first, 7 per week.
+    Each cell is (day_num, type): 'race' | 'bout' | 'bout1' | 'maintenance' | 'bout2' | None.
+    type_map maps date ordinals to their cell type.
     """
-    weeks = monthcalendar(year, month)
-    result = []
-    race_norm = (
-        race_date.replace(hour=0, minute=0, second=0, microsecond=0) if race_date else None
+    ord0 = date(year, month, 1).toordinal() - 1
+    return tuple(
+        (day, type_map.get(ord0 + day)) if day else (None, None)
+        for day in chain.from_iterable(_monthcalendar(year, month))
     )
-    for week in weeks:
-        row = []
-        for day in week:
-            if day == 0:
-                row.append((None, None))
-                continue
-            d = datetime(year, month, day)
-            d_norm = d.replace(hour=0, minute=0, second=0, microsecond=0)
-            if race_norm and d_norm == race_norm:
-                cell_type = "race"
-            elif d_norm in bout_set:
-                cell_type = "bout"
-            elif d_norm in maint_set:
-                cell_type = "maintenance"
-            else:
-                cell_type = None
-            row.append((day, cell_type))
-        result.append(row)
-    return result
-
-
-def month_calendar_data_protocol2(
-    year: int,
-    month: int,
-    bout1_set: set[datetime],
-    maint_set: set[datetime],
-    bout2_set: set[datetime],
-    race_date: datetime | None,
-):
+
+
+def _month_span(start_date: date, end_date: date):
+    """Yield (year, month) for every month from start_date's through end_date's, inclusive."""
+    y, m = start_date.year, start_date.month
+    end = (end_date.year, end_date.month)
+    while (y, m) <= end:
+        yield y, m
+        m = m % 12 + 1
+        y += m == 1
+
+
+_INDEX_TEMPLATE: Template | None = None
+
+
+def _index_template() -> Template | str:
     """
-    Build calendar grid for Protocol 2. Each day is (day_num, type): 'race' | 'bout1' | 'maintenance' | 'bout2' | None.
+    index.html for render_template, compiled once and reused.
+    Holding the Template skips the per-call cache key and LRU bookkeeping in
+    Environment.get_template. With auto_reload on (debug mode) the name is returned
+    instead, so template edits are still picked up.
     """
-    weeks = monthcalendar(year, month)
-    result = []
-    race_norm = (
-        race_date.replace(hour=0, minute=0, second=0, microsecond=0) if race_date else None
-    )
-    for week in weeks:
-        row = []
-        for day in week:
-            if day == 0:
-                row.append((None, None))
-                continue
-            d = datetime(year, month, day)
-            d_norm = d.replace(hour=0, minute=0, second=0, microsecond=0)
-            if race_norm and d_norm == race_norm:
-                cell_type = "race"
-            elif d_norm in bout1_set:
-                cell_type = "bout1"
-            elif d_norm in maint_set:
-                cell_type = "maintenance"
-            elif d_norm in bout2_set:
-                cell_type = "bout2"
-            else:
-                cell_type = None
-            row.append((day, cell_type))
-        result.append(row)
-    return result
-
-
-def months_to_show(dates: list[datetime], race_date: datetime) -> list[tuple[int, int]]:
-    """Return list of (year, month) that need to be displayed for the given dates + race."""
-    all_d = set(d.replace(hour=0, minute=0, second=0, microsecond=0) for d in dates)
-    all_d.add(race_date.replace(hour=0, minute=0, second=0, microsecond=0))
-    months = sorted(set((d.year, d.month) for d in all_d))
-    return months
+    global _INDEX_TEMPLATE
+    if app.jinja_env.auto_reload:
+        return "index.html"
+    if _INDEX_TEMPLATE is None:
+        _INDEX_TEMPLATE = app.jinja_env.get_template("index.html")
+    return _INDEX_TEMPLATE
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -182,38 +182,33 @@ def index():
         date_str = request.form.get("race_date", "").strip()
         if not date_str:
             error = "Please enter a race date."
+        elif len(date_str) != 10 or date_str[4] != "-" or date_str[7] != "-":
+            # Cheap shape check first; fromisoformat would also accept e.g. YYYYMMDD
+            error = "Invalid date format. Use YYYY-MM-DD."
         else:
             try:
-                race_date = datetime.strptime(date_str, "%Y-%m-%d")
+                race_date = date.fromisoformat(date_str)
             except ValueError:
                 error = "Invalid date format. Use YYYY-MM-DD."
             if race_date and not error:
-                protocol1_bout, protocol1_maintenance = protocol1_sessions(race_date)
-                protocol2_bout1, protocol2_maint, protocol2_bout2 = protocol2_sessions(race_date)
-
-                # Build calendar data for Protocol 1 (bout + maintenance)
-                p1_all = protocol1_bout + protocol1_maintenance
-                p1_bout_set = sessions_to_set(protocol1_bout)
-                p1_maint_set = sessions_to_set(protocol1_maintenance)
-                for y, m in months_to_show(p1_all, race_date):
-                    grid = month_calendar_data_protocol1(
-                        y, m, p1_bout_set, p1_maint_set, race_date
-                    )
+                protocol1_bout, protocol1_maintenance, p1_type_map = protocol1_sessions(race_date)
+                protocol2_bout1, protocol2_maint, protocol2_bout2, p2_type_map = protocol2_sessions(
+                    race_date
+                )
+
+                # Build calendar data for Protocol 1 (bout + maintenance).
+                # The first bout session is always the earliest date shown.
+                for y, m in _month_span(protocol1_bout[0], race_date):
+                    grid = month_calendar_data(y, m, p1_type_map)
                     protocol1_calendar_months.append((y, m, grid))
 
                 # Build calendar data for Protocol 2
-                p2_bout1_set = sessions_to_set(protocol2_bout1)
-                p2_maint_set = sessions_to_set(protocol2_maint)
-                p2_bout2_set = sessions_to_set(protocol2_bout2)
-                p2_all = protocol2_bout1 + protocol2_maint + protocol2_bout2
-                for y, m in months_to_show(p2_all, race_date):
-                    grid = month_calendar_data_protocol2(
-                        y, m, p2_bout1_set, p2_maint_set, p2_bout2_set, race_date
-                    )
+                for y, m in _month_span(protocol2_bout1[0], race_date):
+                    grid = month_calendar_data(y, m, p2_type_map)
                     protocol2_calendar_months.append((y, m, grid))
 
     return render_template(
-        "index.html",
+        _index_template(),
         race_date=race_date,
         protocol1_bout=protocol1_bout,
         protocol1_maintenance=protocol1_maintenance,